@@ -23,15 +23,21 @@ Usage:
 
     # Dry run mode
     ./push_secrets.py --all --target user@target-machine --dry-run
+
+    # Always use rsync, comparing checksums rather than size/mtime
+    ./push_secrets.py --all --target user@target-machine --verify
 """
 
 import argparse
 import logging
+import shlex
+import shutil
 import subprocess
 import sys
 import os
+import tempfile
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 # Configure logging
 logging.basicConfig(
@@ -47,37 +53,91 @@ _XDG_CONFIG_HOME = os.getenv("XDG_CONFIG_HOME", str(Path.home() / ".config"))
 class SecretManager:
     SECRET_TYPES = {"aws", "ssh", "gpg", "fetch-creds"}
 
-    # Mapping of secret types to their paths and permissions
+    # Permissions applied by rsync to every transferred secret file/directory
+    RSYNC_CHMOD = "D700,F600"
+
+    # Below this many files a single tar stream over ssh beats rsync, whose
+    # per-file comparisons only pay off for larger, mostly-unchanged trees.
+    # --verify always uses rsync, since tar can't compare checksums.
+    TAR_MAX_FILES = 200
+
+    # Mapping of secret types to their paths and any permission fixups that
+    # differ from RSYNC_CHMOD (run in a single ssh command after the transfer)
     SECRET_CONFIGS = {
         "aws": {
             "source": Path.home() / ".aws",
             "target": "~/.aws",
-            "permissions": "chmod 600 ~/.aws/*",
-            "pre_transfer": None,
+            "permissions": None,
         },
         "ssh": {
             "source": Path.home() / ".ssh",
             "target": "~/.ssh",
-            "permissions": "chmod 600 ~/.ssh/id_* && chmod 644 ~/.ssh/*.pub && chmod 600 ~/.ssh/known_hosts",
-            "pre_transfer": None,
+            "permissions": "find ~/.ssh -maxdepth 1 -name '*.pub' -exec chmod 644 {} +",
         },
         "gpg": {
             "source": Path.home() / ".gnupg",
             "target": "~/.gnupg",
-            "permissions": "chmod 700 ~/.gnupg && chmod 600 ~/.gnupg/*",
-            "pre_transfer": None,
+            "permissions": None,
         },
         "fetch-creds": {
             "source": Path(_XDG_CONFIG_HOME) / "fetch-creds",
             "target": "~/.config/fetch-creds",
-            "permissions": "chmod 700 ~/.config/fetch-creds && chmod 600 ~/.config/fetch-creds/*",
-            "pre_transfer": "mkdir -p ~/.config/fetch-creds",
+            "permissions": None,
         },
     }
 
-    def __init__(self, target_host: str, dry_run: bool = False):
+    def __init__(self, target_host: str, dry_run: bool = False, verify: bool = False):
         self.target_host = target_host
         self.dry_run = dry_run
+        self.verify = verify
+        # Populated by _open_master_connection so every rsync/ssh call shares a
+        # single SSH connection and only pays for the handshake once.
+        self._control_dir: Optional[str] = None
+        self._ssh_opts: List[str] = []
+
+    def _ssh_command(self, *args: str) -> List[str]:
+        """Build an ssh command that reuses the shared master connection."""
+        return ["ssh", *self._ssh_opts, *args]
+
+    def _rsync_shell(self) -> str:
+        """Return the remote shell rsync should use (passed via -e)."""
+        return shlex.join(self._ssh_command())
+
+    def _open_master_connection(self) -> None:
+        """Establish a background SSH ControlMaster connection to the target."""
+        # Unix socket paths are limited to ~104 bytes on macOS, so keep the
+        # socket short: a /tmp directory (not the long $TMPDIR under
+        # /var/folders) and %C, a fixed-length hash of the connection details.
+        self._control_dir = tempfile.mkdtemp(prefix="push-secrets-", dir="/tmp")
+        self._ssh_opts = [
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={self._control_dir}/%C",
+            "-o",
+            "ControlPersist=60s",
+        ]
+        logger.info(f"Opening shared SSH connection to {self.target_host}...")
+        subprocess.run(
+            self._ssh_command("-N", "-f", self.target_host),
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+
+    def _close_master_connection(self) -> None:
+        """Shut down the shared SSH connection and remove its control socket."""
+        if self._control_dir is None:
+            return
+        subprocess.run(
+            self._ssh_command("-O", "exit", self.target_host),
+            check=False,
+            capture_output=True,
+            text=True,
+        )
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+        self._ssh_opts = []
 
     def validate_secret_types(self, types: List[str]) -> None:
         """Validate that all specified secret types are supported."""
@@ -96,66 +156,218 @@ class SecretManager:
                 logger.info(f"  - {type_}")
             return
 
+        configs = []
         for type_ in types:
             config = self.SECRET_CONFIGS[type_]
-            source = config["source"]
-            target = f"{self.target_host}:{config['target']}"
-
-            if not source.exists():
-                logger.warning(f"Source directory {source} does not exist")
+            if not config["source"].exists():
+                logger.warning(f"Source directory {config['source']} does not exist")
                 continue
+            logger.info(
+                f"Transferring {type_} secrets from {config['source']} "
+                f"to {self.target_host}:{config['target']}..."
+            )
+            configs.append(config)
 
-            logger.info(f"Transferring {type_} secrets from {source} to {target}...")
-
-            # Run pre-transfer command if specified
-            if config["pre_transfer"]:
-                try:
-                    logger.info(f"Running pre-transfer command for {type_}...")
-                    subprocess.run(
-                        ["ssh", self.target_host, config["pre_transfer"]],
-                        check=True,
-                        capture_output=True,
-                        text=True,
-                    )
-                except subprocess.CalledProcessError as e:
+        if not configs:
+            return
+
+        try:
+            self._open_master_connection()
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error connecting to {self.target_host}: {e.stderr}")
+            self._close_master_connection()
+            raise
+
+        try:
+            self._transfer_configs(configs)
+        finally:
+            self._close_master_connection()
+
+    def _transfer_configs(self, configs: List[dict]) -> None:
+        """Transfer secrets in as few round-trips as possible, then fix modes."""
+        # Secrets that live at the same home-relative path locally and
+        # remotely are sent together, either as one tar stream or in one
+        # `rsync --relative` call.
+        home = Path.home()
+        relative_configs = []
+        transferred = []
+        for config in configs:
+            relative_target = config["target"].removeprefix("~/")
+            if config["source"] == home / relative_target:
+                relative_configs.append(config)
+            # e.g. a custom XDG_CONFIG_HOME: copy the contents directly,
+            # creating the target directory first on the remote side.
+            elif self._rsync(
+                [f"{config['source']}/"],
+                f"{config['target']}/",
+                [f"--rsync-path=mkdir -p {config['target']} && rsync"],
+            ):
+                transferred.append(config)
+            else:
+                # Keep going so one failure doesn't block the other secrets
+                logger.error(f"Failed to transfer {config['source']}, skipping")
+
+        if relative_configs:
+            relative_paths = [
+                config["target"].removeprefix("~/") for config in relative_configs
+            ]
+            sources = [home / path for path in relative_paths]
+            if (
+                not self.verify
+                and self._count_files(sources, self.TAR_MAX_FILES) < self.TAR_MAX_FILES
+            ):
+                # The tar pipe applies the permission fixups in its own session
+                fixups = [
+                    c["permissions"] for c in relative_configs if c["permissions"]
+                ]
+                if not self._tar_pipe(home, relative_paths, fixups):
                     logger.error(
-                        f"Error running pre-transfer command for {type_}: {e.stderr}"
+                        "Failed to transfer secrets: " + ", ".join(map(str, sources))
                     )
-                    continue
-
-            # Use rsync to transfer files
-            try:
-                # subprocess.run arguments explained:
-                # - ["rsync", "-av", "--checksum", f"{source}/", f"{target}/"]: Command and args
-                #   - rsync: The rsync command for efficient file transfer
-                #   - -a: Archive mode (preserves permissions, timestamps, etc.)
-                #   - -v: Verbose output for better visibility
-                #   - --checksum: Use checksums instead of file size/time for comparison
-                #   - f"{source}/": Source directory with trailing slash to copy contents
-                #   - f"{target}/": Target directory with trailing slash
-                # - check=True: Raise CalledProcessError if command fails
-                # - capture_output=True: Capture stdout/stderr instead of printing to terminal
-                # - text=True: Return captured output as strings instead of bytes
-                subprocess.run(
-                    ["rsync", "-av", "--checksum", f"{source}/", f"{target}/"],
-                    check=True,
-                    capture_output=True,
-                    text=True,
+            # The `/./` marker tells rsync which part of each path to
+            # recreate under the remote home. --no-implied-dirs stops rsync
+            # from also syncing parents like ~/.config (resetting their mode,
+            # or replacing them if they are symlinks), so create any missing
+            # parents up front instead.
+            elif self._rsync(
+                [f"{home}/./{path}" for path in relative_paths],
+                "~/",
+                [
+                    "--relative",
+                    "--no-implied-dirs",
+                    *self._mkdir_rsync_path(
+                        [str(Path(path).parent) for path in relative_paths]
+                    ),
+                ],
+            ):
+                transferred.extend(relative_configs)
+            else:
+                logger.error(
+                    "Failed to transfer secrets: " + ", ".join(map(str, sources))
                 )
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error transferring {type_} secrets: {e.stderr}")
-                continue
 
-            # Set permissions on target machine
+        # Apply the few permissions that differ from RSYNC_CHMOD in one go,
+        # only for secrets that actually made it across
+        fixups = [
+            config["permissions"] for config in transferred if config["permissions"]
+        ]
+        if fixups:
             try:
                 subprocess.run(
-                    ["ssh", self.target_host, config["permissions"]],
+                    self._ssh_command(self.target_host, " && ".join(fixups)),
                     check=True,
                     capture_output=True,
                     text=True,
                 )
             except subprocess.CalledProcessError as e:
-                logger.error(f"Error setting permissions for {type_}: {e.stderr}")
+                logger.error(f"Error setting permissions: {e.stderr}")
+
+    @staticmethod
+    def _mkdir_rsync_path(relative_dirs: List[str]) -> List[str]:
+        """Build an --rsync-path that creates remote home-relative directories."""
+        dirs = sorted({f"~/{shlex.quote(d)}" for d in relative_dirs if d != "."})
+        if not dirs:
+            return []
+        return [f"--rsync-path=mkdir -p {' '.join(dirs)} && rsync"]
+
+    @staticmethod
+    def _count_files(paths: List[Path], limit: int) -> int:
+        """Count entries under paths, stopping early once limit is reached."""
+        count = 0
+        for path in paths:
+            for _ in path.rglob("*"):
+                count += 1
+                if count >= limit:
+                    return count
+        return count
+
+    def _tar_pipe(
+        self, root: Path, relative_paths: List[str], post_commands: List[str]
+    ) -> bool:
+        """Stream relative_paths under root to the remote home as one tar archive.
+
+        Extraction, permission changes and post_commands all run in a single
+        remote ssh command. Returns success.
+        """
+        # Match RSYNC_CHMOD exactly: only the entries in the archive are
+        # changed (not files that exist only on the remote), directories get
+        # 700 and regular files 600. Symlinks are left alone, as with rsync.
+        dirs, files = [], []
+        for path in relative_paths:
+            for entry in [root / path, *(root / path).rglob("*")]:
+                remote_entry = f"~/{shlex.quote(str(entry.relative_to(root)))}"
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    dirs.append(remote_entry)
+                elif entry.is_file():
+                    files.append(remote_entry)
+
+        commands = ["tar -xf - -C ~"]
+        if dirs:
+            commands.append(f"chmod 700 {' '.join(dirs)}")
+        if files:
+            commands.append(f"chmod 600 {' '.join(files)}")
+        remote_command = " && ".join([*commands, *post_commands])
+        # Keep macOS tar from adding AppleDouble (._*) files to the archive
+        env = {**os.environ, "COPYFILE_DISABLE": "1"}
+
+        tar = subprocess.Popen(
+            ["tar", "-cf", "-", "-C", str(root), *relative_paths],
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        ssh = subprocess.Popen(
+            self._ssh_command(self.target_host, remote_command), stdin=tar.stdout
+        )
+        # Close our copy of the pipe so tar sees SIGPIPE if ssh exits early
+        tar.stdout.close()
+        ssh_returncode = ssh.wait()
+        tar_returncode = tar.wait()
+
+        if tar_returncode != 0 or ssh_returncode != 0:
+            logger.error(
+                "Error transferring secrets: "
+                f"tar exited with status {tar_returncode}, "
+                f"ssh exited with status {ssh_returncode}"
+            )
+            return False
+        return True
+
+    def _rsync(self, sources: List[str], target: str, extra_args: List[str]) -> bool:
+        """Rsync sources to target on the remote host, returning success."""
+        try:
+            # subprocess.run arguments explained:
+            # - rsync: The rsync command for efficient file transfer
+            #   - -a: Archive mode (preserves permissions, timestamps, etc.)
+            #   - -v: Verbose output for better visibility
+            #   - -e: Remote shell that reuses the shared SSH master connection
+            #   - --chmod: Set secret-appropriate permissions during the transfer
+            #   - --checksum (only with --verify): Compare checksums instead of the
+            #     default size/mtime quick check, at the cost of hashing every file
+            # - check=True: Raise CalledProcessError if command fails
+            # - Output is not captured, so rsync's progress streams straight to
+            #   the terminal instead of being buffered until it exits
+            subprocess.run(
+                [
+                    "rsync",
+                    "-av",
+                    "-e",
+                    self._rsync_shell(),
+                    f"--chmod={self.RSYNC_CHMOD}",
+                    *(["--checksum"] if self.verify else []),
+                    *extra_args,
+                    *sources,
+                    f"{self.target_host}:{target}",
+                ],
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(
+                f"Error transferring secrets: rsync exited with status {e.returncode}"
+            )
+            return False
+        return True
 
 
 def main():
@@ -172,6 +384,12 @@ def main():
         action="store_true",
         help="Show what would be transferred without making changes",
     )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Always transfer with rsync, comparing file checksums instead of "
+        "size/mtime",
+    )
 
     args = parser.parse_args()
 
@@ -179,7 +397,7 @@ def main():
         parser.error("Either --all or --limit must be specified")
 
     try:
-        manager = SecretManager(args.target, args.dry_run)
+        manager = SecretManager(args.target, args.dry_run, args.verify)
 
         if args.all:
             types_to_transfer = list(SecretManager.SECRET_TYPES)
@@ -192,6 +410,9 @@ def main():
     except ValueError as e:
         logger.error(f"Error: {e}")
         sys.exit(1)
+    except subprocess.CalledProcessError:
+        # Details have already been logged by the SecretManager
+        sys.exit(1)
     except KeyboardInterrupt:
         logger.error("\nOperation cancelled by user")
         sys.exit(1)
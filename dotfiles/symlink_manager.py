@@ -25,6 +25,9 @@ Usage:
     # Exclude specific dotfiles
     ./symlink_manager.py --all --exclude nvim-with-plugins
 
+    # Limit the number of dotfiles symlinked in parallel
+    ./symlink_manager.py --all --jobs 2
+
 Note:
     This script is designed to be as portable as possible. As such, it:
     1. Uses only Python standard library modules
@@ -38,12 +41,17 @@ Environment Variables:
 """
 
 import argparse
+import functools
 import logging
 import os
 import sys
 import platform
+import stat
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Set
+from types import MappingProxyType
+from typing import List, Dict, Set, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -53,95 +61,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Resolved once at import; the home directory doesn't change during a run
+_HOME = Path.home()
+
+# Default mappings for common dotfiles, as
+# (name, source path parts, target root, target path parts). Target roots are
+# "home" or "config"; Paths are only built for the dotfiles being processed.
+_MAPPING: Tuple[Tuple[str, Tuple[str, ...], str, Tuple[str, ...]], ...] = (
+    ("bashrc", ("bashrc",), "home", (".bashrc",)),
+    ("bash_aliases", ("bash_aliases",), "home", (".bash_aliases",)),
+    ("bash_env", ("bash_env",), "home", (".bash_env",)),
+    ("npmrc", ("npmrc",), "home", (".npmrc",)),
+    ("git", ("git", "config"), "home", (".git", "config")),
+    ("tmux", ("tmux", "tmux.conf"), "config", ("tmux", "tmux.conf")),
+    ("nvim-plugins", ("nvim-plugins",), "config", ("nvim",)),
+    ("nvim-no-plugins", ("nvim-no-plugins",), "config", ("nvim",)),
+    (
+        "vscode",
+        ("vscode", "settings.json"),
+        "config",
+        ("Code", "User", "settings.json"),
+    ),
+    (
+        "cursor",
+        ("cursor", "settings.json"),
+        "config",
+        ("Cursor", "User", "settings.json"),
+    ),
+)
+_MAPPING_BY_NAME = MappingProxyType({entry[0]: entry for entry in _MAPPING})
+
 
+@functools.lru_cache(maxsize=1)
 def get_default_config_dir() -> Path:
     """Get the platform-specific default config directory."""
     system = platform.system().lower()
     if system == "darwin":  # macOS
-        return Path.home() / "Library" / "Application Support"
+        return _HOME / "Library" / "Application Support"
     elif system == "linux":
-        return Path.home() / ".config"
+        return _HOME / ".config"
     else:
         # Default to .config for other platforms, but warn
         logger.warning(f"Unsupported platform {system}, defaulting to ~/.config")
-        return Path.home() / ".config"
+        return _HOME / ".config"
 
 
 class DotfilesManager:
-    def __init__(self, dotfiles_dir: Path):
+    def __init__(self, dotfiles_dir: Path, jobs: int = 8):
         self.dotfiles_dir = dotfiles_dir
-        self.home_dir = Path.home()
+        # Maximum number of dotfiles to symlink concurrently
+        self.jobs = jobs
+        self.home_dir = _HOME
         # Allow override of config directory via environment variable
         self.config_dir = Path(os.getenv("CONFIG_DIR", str(get_default_config_dir())))
-        self.config_mapping: Dict[str, Dict[str, Path]] = {}
-        self._load_config_mapping()
-
-    def _load_config_mapping(self):
-        """Load the mapping of dotfiles to their target locations."""
-        # Default mappings for common dotfiles
-        self.config_mapping = {
-            "bashrc": {
-                "source": self.dotfiles_dir / "bashrc",
-                "target": self.home_dir / ".bashrc",
-            },
-            "bash_aliases": {
-                "source": self.dotfiles_dir / "bash_aliases",
-                "target": self.home_dir / ".bash_aliases",
-            },
-            "bash_env": {
-                "source": self.dotfiles_dir / "bash_env",
-                "target": self.home_dir / ".bash_env",
-            },
-            "npmrc": {
-                "source": self.dotfiles_dir / "npmrc",
-                "target": self.home_dir / ".npmrc",
-            },
-            "git": {
-                "source": self.dotfiles_dir / "git" / "config",
-                "target": self.home_dir / ".git" / "config",
-            },
-            "tmux": {
-                "source": self.dotfiles_dir / "tmux" / "tmux.conf",
-                "target": self.config_dir / "tmux" / "tmux.conf",
-            },
-            "nvim-plugins": {
-                "source": self.dotfiles_dir / "nvim-plugins",
-                "target": self.config_dir / "nvim",
-            },
-            "nvim-no-plugins": {
-                "source": self.dotfiles_dir / "nvim-no-plugins",
-                "target": self.config_dir / "nvim",
-            },
-            "vscode": {
-                "source": self.dotfiles_dir / "vscode" / "settings.json",
-                "target": self.config_dir / "Code" / "User" / "settings.json",
-            },
-            "cursor": {
-                "source": self.dotfiles_dir / "cursor" / "settings.json",
-                "target": self.config_dir / "Cursor" / "User" / "settings.json",
-            },
-        }
-
-    def _check_duplicate_targets(self, dotfiles_to_process: List[str]) -> None:
+        # Parent directories already ensured to exist, so shared parents
+        # (e.g. ~/.config) are only created once per run
+        self._ensured_dirs: Set[Path] = set()
+        self._target_roots = {"home": self.home_dir, "config": self.config_dir}
+
+    def _resolve_mapping(self, names: List[str]) -> Dict[str, Dict[str, Path]]:
+        """Build source/target paths for the given (known) dotfile names."""
+        config_mapping = {}
+        for name in names:
+            _, source_parts, target_root, target_parts = _MAPPING_BY_NAME[name]
+            config_mapping[name] = {
+                "source": self.dotfiles_dir.joinpath(*source_parts),
+                "target": self._target_roots[target_root].joinpath(*target_parts),
+            }
+        return config_mapping
+
+    def _check_duplicate_targets(
+        self, config_mapping: Dict[str, Dict[str, Path]]
+    ) -> None:
         """Check if any of the specified dotfiles would create duplicate target paths."""
-        target_to_dotfiles: Dict[Path, List[str]] = {}
-
-        for name in dotfiles_to_process:
-            if name in self.config_mapping:
-                target = self.config_mapping[name]["target"]
-                if target in target_to_dotfiles:
-                    target_to_dotfiles[target].append(name)
-                else:
-                    target_to_dotfiles[target] = [name]
-
         # Find any targets that have multiple dotfiles mapping to them
-        duplicates = {
-            target: dotfiles
-            for target, dotfiles in target_to_dotfiles.items()
-            if len(dotfiles) > 1
+        target_counts = Counter(
+            mapping["target"] for mapping in config_mapping.values()
+        )
+        duplicate_targets = {
+            target for target, count in target_counts.items() if count > 1
         }
 
-        if duplicates:
+        if duplicate_targets:
+            # Only collect the offending names when there is something to report
+            duplicates: Dict[Path, List[str]] = {}
+            for name, mapping in config_mapping.items():
+                if mapping["target"] in duplicate_targets:
+                    duplicates.setdefault(mapping["target"], []).append(name)
+
             error_msg = "Found duplicate target paths:\n"
             for target, dotfiles in duplicates.items():
                 error_msg += f"  {target} is targeted by: {', '.join(dotfiles)}\n"
@@ -150,13 +157,10 @@ class DotfilesManager:
     def symlink_all(self, exclude: Set[str] = None) -> None:
         """Create symlinks for all dotfiles except those in exclude."""
         exclude = exclude or set()
-        dotfiles_to_process = [
-            name for name in self.config_mapping.keys() if name not in exclude
-        ]
-        self._check_duplicate_targets(dotfiles_to_process)
-        for name in dotfiles_to_process:
-            mapping = self.config_mapping[name]
-            self._create_symlink(mapping["source"], mapping["target"])
+        dotfiles_to_process = [name for name in _MAPPING_BY_NAME if name not in exclude]
+        config_mapping = self._resolve_mapping(dotfiles_to_process)
+        self._check_duplicate_targets(config_mapping)
+        self._create_symlinks(config_mapping)
 
     def symlink_specific(self, dotfiles: List[str], exclude: Set[str] = None) -> None:
         """Create symlinks only for specified dotfiles."""
@@ -164,12 +168,30 @@ class DotfilesManager:
         dotfiles_to_process = [
             name
             for name in dotfiles
-            if name in self.config_mapping and name not in exclude
+            if name in _MAPPING_BY_NAME and name not in exclude
         ]
-        self._check_duplicate_targets(dotfiles_to_process)
-        for name in dotfiles_to_process:
-            mapping = self.config_mapping[name]
-            self._create_symlink(mapping["source"], mapping["target"])
+        config_mapping = self._resolve_mapping(dotfiles_to_process)
+        self._check_duplicate_targets(config_mapping)
+        self._create_symlinks(config_mapping)
+
+    def _create_symlinks(self, config_mapping: Dict[str, Dict[str, Path]]) -> None:
+        """Create symlinks for every mapping, several at a time.
+
+        Targets are known to be unique, so each worker touches its own paths;
+        the filesystem calls release the GIL and overlap.
+        """
+        if not config_mapping:
+            return
+        max_workers = max(1, min(self.jobs, len(config_mapping)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(
+                executor.map(
+                    lambda mapping: self._create_symlink(
+                        mapping["source"], mapping["target"]
+                    ),
+                    config_mapping.values(),
+                )
+            )
 
     def _create_symlink(self, source: Path, target: Path) -> None:
         """Create a symlink from source to target, handling existing files."""
@@ -178,22 +200,34 @@ class DotfilesManager:
             return
 
         # Create parent directories if they don't exist
-        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.parent not in self._ensured_dirs:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._ensured_dirs.add(target.parent)
+
+        # Work with plain strings from here on to skip pathlib's wrappers
+        source_str = os.fspath(source)
+        target_str = os.fspath(target)
 
-        # Handle existing files/symlinks
-        if target.exists():
-            if target.is_symlink():
-                target.unlink()
+        # Handle existing files/symlinks with a single lstat, which (unlike
+        # exists()) also catches dangling symlinks
+        try:
+            target_stat = os.lstat(target_str)
+        except FileNotFoundError:
+            target_stat = None
+
+        if target_stat is not None:
+            if stat.S_ISLNK(target_stat.st_mode):
+                os.unlink(target_str)
             else:
-                backup = target.with_suffix(".backup")
-                logger.info(f"Backing up existing {target} to {backup}")
-                target.rename(backup)
+                backup_str = target_str + ".backup"
+                logger.info(f"Backing up existing {target_str} to {backup_str}")
+                os.replace(target_str, backup_str)
 
         try:
-            target.symlink_to(source)
-            logger.info(f"Created symlink: {target} -> {source}")
+            os.symlink(source_str, target_str)
+            logger.info(f"Created symlink: {target_str} -> {source_str}")
         except Exception as e:
-            logger.error(f"Error creating symlink {target}: {e}")
+            logger.error(f"Error creating symlink {target_str}: {e}")
 
 
 def main():
@@ -207,12 +241,18 @@ def main():
         "--map",
         help="Custom mapping in format dotfile:path (can be used multiple times)",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Maximum number of dotfiles to symlink in parallel (default: 8)",
+    )
 
     args = parser.parse_args()
 
     # Get the directory where this script is located
     script_dir = Path(__file__).parent
-    manager = DotfilesManager(script_dir)
+    manager = DotfilesManager(script_dir, jobs=args.jobs)
 
     exclude = set(args.exclude.split(",")) if args.exclude else set()
 
@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 import argparse
+import functools
+import hashlib
 import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import IO, Callable, Dict, List, Optional
 
 # Configure logging
 logging.basicConfig(
@@ -16,41 +25,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Matches one package per line, ignoring blank lines and `#` comments
+# (full-line or inline) along with surrounding whitespace.
+PACKAGE_RE = re.compile(r"^[ \t]*([^#\s][^#\n]*?)[ \t]*(?:#.*)?$", re.MULTILINE)
+
+# Options shared by every apt-get invocation: no pty progress bars, retry
+# flaky mirrors, pipeline HTTP requests, and skip translation downloads.
+APT_OPTIONS = [
+    "-o",
+    "Dpkg::Use-Pty=0",
+    "-o",
+    "Acquire::Languages=none",
+    "-o",
+    "Acquire::Retries=3",
+    "-o",
+    "Acquire::http::Pipeline-Depth=10",
+]
+
+# Package files (without the .txt suffix) read once at startup
+PACKAGE_FILES = ("apt", "brew", "rustup-component", "uv-python", "uv-tool", "npx")
+
+# Fingerprints of package lists plus installed state, used to skip installers
+# when nothing has changed since their last successful run.
+FINGERPRINT_DIR = (
+    Path(os.getenv("XDG_CACHE_HOME", str(Path.home() / ".cache"))) / "workbench"
+)
+
+# Commands listing what each package manager currently has installed. dpkg
+# also lists removed-but-not-purged packages, so include their status too.
+APT_STATE_COMMAND = ["dpkg-query", "-W", "-f", "${Package} ${db:Status-Abbrev}\\n"]
+UV_TOOL_STATE_COMMAND = ["uv", "tool", "list"]
+NPM_STATE_COMMAND = ["npm", "ls", "-g", "--depth=0", "--json"]
+
+# Name of the installer running on the current thread, used to tag command
+# output so lines from concurrent installers can be told apart
+_current_installer = threading.local()
+
+
+def installer_label() -> str:
+    """Return the name of the installer running on this thread, if any."""
+    return getattr(_current_installer, "name", "")
+
+
+def forward_output(stream: IO[str], log: Callable[[str], None]) -> None:
+    """Log each line from a command's output stream as it arrives."""
+    with stream:
+        for line in stream:
+            line = line.rstrip()
+            if line:
+                log(line)
+
 
 def run_command(
-    cmd: List[str], check: bool = True, log_output: bool = True
+    cmd: List[str],
+    check: bool = True,
+    log_output: bool = True,
+    env: Optional[Dict[str, str]] = None,
+    label: Optional[str] = None,
 ) -> subprocess.CompletedProcess:
     """Run a shell command and return the result.
 
+    Output is streamed to the logger line by line while the command runs,
+    rather than buffered in memory until it exits. Each line is prefixed with
+    the installer's label so concurrent output stays attributable.
+
     Args:
         cmd: Command and arguments as a list of strings
-        check: If True, raise CalledProcessError on non-zero exit code
+        check: If True, exit the script on non-zero exit code
         log_output: If True, log the command's stdout/stderr output
+        env: Optional environment for the command (defaults to the current one)
+        label: Prefix for output lines (defaults to the current installer)
     """
-    try:
-        result = subprocess.run(cmd, check=check, text=True, capture_output=True)
-        # Print the command's output if there is any and logging is enabled
+    label = installer_label() if label is None else label
+    prefix = f"[{label}] " if label else ""
+    output = subprocess.PIPE if log_output else subprocess.DEVNULL
+    with subprocess.Popen(
+        cmd, stdout=output, stderr=output, text=True, bufsize=65536, env=env
+    ) as process:
         if log_output:
-            if result.stdout:
-                logger.info(result.stdout.rstrip())
-            if result.stderr:
-                logger.error(result.stderr.rstrip())
-        return result
-    except subprocess.CalledProcessError as e:
+            # Drain stderr on its own thread so neither pipe can fill up and
+            # block the command while we read the other.
+            stderr_thread = threading.Thread(
+                target=forward_output,
+                args=(process.stderr, lambda line: logger.error(prefix + line)),
+            )
+            stderr_thread.start()
+            forward_output(process.stdout, lambda line: logger.info(prefix + line))
+            stderr_thread.join()
+
+    result = subprocess.CompletedProcess(cmd, process.returncode)
+    if check and result.returncode != 0:
         logger.error(f"Command failed: {' '.join(cmd)}")
-        logger.error(f"Error: {e.stderr}")
-        if check:
-            sys.exit(1)
-        return e
+        logger.error(f"Exit code: {result.returncode}")
+        sys.exit(1)
+    return result
 
 
 def command_exists(cmd: str) -> bool:
     """Check if a command exists in the system."""
-    try:
-        run_command(["which", cmd], check=False, log_output=False)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+    return shutil.which(cmd) is not None
 
 
 def require_command(cmd: str) -> None:
@@ -67,46 +140,78 @@ def read_packages(file_path: str) -> List[str]:
         logger.error(f"Package file not found: {file_path}")
         sys.exit(1)
 
-    packages = []
-    with open(path) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                # Remove inline comments
-                package = line.split("#")[0].strip()
-                if package:
-                    packages.append(package)
-    return packages
+    return [
+        package.strip() for package in PACKAGE_RE.findall(path.read_text()) if package
+    ]
 
 
-def install_apt_packages() -> None:
-    """Install apt packages."""
-    script_dir = Path(__file__).parent
-    apt_file = script_dir / "apt.txt"
+def package_fingerprint(packages: List[str], state_cmd: List[str]) -> Optional[str]:
+    """Hash a package list together with the package manager's installed state.
 
+    Returns None if the installed state can't be determined.
+    """
+    try:
+        state = subprocess.run(state_cmd, check=True, capture_output=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return hashlib.sha256("\n".join(packages).encode() + state).hexdigest()
+
+
+def needs_install(name: str, packages: List[str], state_cmd: List[str]) -> bool:
+    """Check whether an installer's inputs changed since its last successful run."""
+    fingerprint = package_fingerprint(packages, state_cmd)
+    fingerprint_file = FINGERPRINT_DIR / f"{name}.fingerprint"
+    if fingerprint is None or not fingerprint_file.exists():
+        return True
+    return fingerprint_file.read_text().strip() != fingerprint
+
+
+def save_fingerprint(name: str, packages: List[str], state_cmd: List[str]) -> None:
+    """Record the post-install fingerprint so unchanged reruns are skipped."""
+    fingerprint = package_fingerprint(packages, state_cmd)
+    if fingerprint is None:
+        return
+    FINGERPRINT_DIR.mkdir(parents=True, exist_ok=True)
+    (FINGERPRINT_DIR / f"{name}.fingerprint").write_text(fingerprint)
+
+
+def install_apt_packages(packages: List[str]) -> None:
+    """Install apt packages."""
     logger.info("Starting system package installation...")
-    logger.info("Updating apt package lists to ensure latest versions...")
-    run_command(["sudo", "apt", "update"])
+    if not needs_install("apt", packages, APT_STATE_COMMAND):
+        logger.info("apt packages are up to date, skipping")
+        return
 
-    packages = read_packages(str(apt_file))
-    if packages:
-        logger.info(f"Installing {len(packages)} system packages via apt:")
-        run_command(["sudo", "apt", "install", "-y"] + packages)
-    else:
+    if not packages:
         logger.warning("No apt packages found to install")
+        return
 
+    # `sudo -E` preserves DEBIAN_FRONTEND so dpkg never prompts.
+    env = {**os.environ, "DEBIAN_FRONTEND": "noninteractive"}
+    apt_get = ["sudo", "-E", "apt-get"] + APT_OPTIONS
 
-def install_homebrew() -> None:
-    """Install Homebrew packages."""
-    script_dir = Path(__file__).parent
-    brew_file = script_dir / "brew.txt"
+    logger.info("Updating apt package lists to ensure latest versions...")
+    run_command(apt_get + ["update"], env=env)
+
+    logger.info(f"Installing {len(packages)} system packages via apt:")
+    run_command(
+        apt_get + ["install", "--no-install-recommends", "-y"] + packages, env=env
+    )
+    save_fingerprint("apt", packages, APT_STATE_COMMAND)
 
+
+def install_homebrew(packages: List[str]) -> None:
+    """Install Homebrew packages."""
     logger.info("Starting Homebrew package installation...")
-    packages = read_packages(str(brew_file))
     if packages:
         logger.info(f"Installing {len(packages)} packages via Homebrew:")
-        for package in packages:
-            run_command(["brew", "install", package])
+        # Skip tap auto-updates and dependent checks; we install in one batch.
+        env = {
+            **os.environ,
+            "HOMEBREW_NO_AUTO_UPDATE": "1",
+            "HOMEBREW_NO_INSTALLED_DEPENDENTS_CHECK": "1",
+        }
+        run_command(["brew", "install"] + packages, env=env)
     else:
         logger.warning("No Homebrew packages found to install")
 
@@ -122,13 +227,9 @@ def install_rust() -> None:
     logger.info("Rust toolchain installation complete")
 
 
-def install_rustup_components() -> None:
+def install_rustup_components(components: List[str]) -> None:
     """Install Rustup components"""
-    script_dir = Path(__file__).parent
-    component_file = script_dir / "rustup-component.txt"
-
     logger.info("Starting Rustup component installation...")
-    components = read_packages(str(component_file))
     if components:
         logger.info(f"Installing {len(components)} Rustup components:")
         for component in components:
@@ -137,56 +238,109 @@ def install_rustup_components() -> None:
         logger.warning("No rustup components to install")
 
 
-def install_python() -> None:
+def install_python(versions: List[str]) -> None:
     """Install Python versions using uv."""
-    script_dir = Path(__file__).parent
-    python_file = script_dir / "uv-python.txt"
-
     logger.info("Starting Python version installation via uv...")
-    versions = read_packages(str(python_file))
     if versions:
         logger.info(f"Installing {len(versions)} Python versions:")
-        for version in versions:
-            run_command(["uv", "python", "install", version])
+        run_command(["uv", "python", "install"] + versions)
     else:
         logger.warning("No Python versions found to install")
 
 
-def install_python_tools() -> None:
+def install_python_tools(tools: List[str]) -> None:
     """Install Python tools using uv."""
-    script_dir = Path(__file__).parent
-    tools_file = script_dir / "uv-tool.txt"
     ssh_dir = Path.home() / ".ssh"
 
     logger.info("Starting Python tool installation via uv...")
-    tools = read_packages(str(tools_file))
+    if not needs_install("uv-tool", tools, UV_TOOL_STATE_COMMAND):
+        logger.info("Python tools are up to date, skipping")
+        return
+
     if tools:
         logger.info(f"Installing {len(tools)} Python tools:")
+        to_install = []
         for tool in tools:
             if tool.startswith("git+ssh://") and not ssh_dir.exists():
                 logger.warning(f"Skipping {tool} as ~/.ssh directory does not exist")
                 continue
-            run_command(["uv", "tool", "install", tool])
+            to_install.append(tool)
+
+        # `uv tool install` only accepts one package, but each tool gets its
+        # own venv, so the installs can safely run in parallel. Pool threads
+        # don't inherit the installer label, so pass it along explicitly.
+        if to_install:
+            label = installer_label()
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(
+                    executor.map(
+                        lambda tool: run_command(
+                            ["uv", "tool", "install", tool], label=label
+                        ),
+                        to_install,
+                    )
+                )
+
+        # Only remember a complete install, so skipped tools are retried
+        if len(to_install) == len(tools):
+            save_fingerprint("uv-tool", tools, UV_TOOL_STATE_COMMAND)
     else:
         logger.warning("No Python tools found to install")
 
 
-def install_npx() -> None:
+def install_npx(packages: List[str]) -> None:
     """Install NPX packages."""
-    script_dir = Path(__file__).parent
-    npx_file = script_dir / "npx.txt"
-
     logger.info("Starting global NPX package installation...")
-    packages = read_packages(str(npx_file))
+    if not needs_install("npx", packages, NPM_STATE_COMMAND):
+        logger.info("Global NPX packages are up to date, skipping")
+        return
+
     if packages:
         logger.info(f"Installing {len(packages)} global NPX packages:")
         for package in packages:
             logger.info(f"  - {package}")
-            run_command(["npm", "install", "-g", package])
+        run_command(
+            ["npm", "install", "-g", "--prefer-offline", "--no-audit", "--no-fund"]
+            + packages
+        )
+        save_fingerprint("npx", packages, NPM_STATE_COMMAND)
     else:
         logger.warning("No NPX packages found to install")
 
 
+def start_log_listener() -> Callable[[], None]:
+    """Route all log records through a queue drained by a single thread.
+
+    Installers run concurrently, so this keeps them from blocking on terminal
+    output. Returns a function that stops the listener, flushing any queued
+    records, and restores the original handlers.
+    """
+    root = logging.getLogger()
+    original_handlers = root.handlers
+    log_queue: queue.Queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *original_handlers)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+
+    def stop() -> None:
+        listener.stop()
+        root.handlers = original_handlers
+
+    return stop
+
+
+def run_in_order(installers: List[Callable[[], None]]) -> None:
+    """Run a chain of installers that depend on each other sequentially."""
+    for installer in installers:
+        # Unwrap functools.partial to label output by the installer's name
+        name = getattr(installer, "func", installer).__name__
+        _current_installer.name = name.removeprefix("install_")
+        try:
+            installer()
+        finally:
+            _current_installer.name = ""
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Set up a development environment on Ubuntu 24.04",
@@ -198,6 +352,11 @@ This script sets up a development environment on Ubuntu 24.04 by installing:
 - Rust toolchain
 - Python versions and tools via uv
 - NPX packages
+
+apt, uv tool and NPX installs are skipped when their package list and the
+installed packages are unchanged since the last successful run. Delete
+$XDG_CACHE_HOME/workbench (~/.cache/workbench by default) to force them to
+run again.
         """,
     )
     parser.parse_args()
@@ -211,15 +370,42 @@ This script sets up a development environment on Ubuntu 24.04 by installing:
     require_command("brew")
     logger.info("All required commands are available")
 
+    # Read every package file once up front, so missing files fail early and
+    # the installers only deal with parsed lists
+    script_dir = Path(__file__).parent
+    packages = {
+        name: read_packages(str(script_dir / f"{name}.txt")) for name in PACKAGE_FILES
+    }
+
     # Run installations
     logger.info("Beginning package installations...")
-    install_apt_packages()
-    install_homebrew()
-    install_rust()
-    install_rustup_components()
-    install_python()
-    install_python_tools()
-    install_npx()
+    stop_log_listener = start_log_listener()
+    try:
+        # apt runs first so the sudo prompt happens up front, and Homebrew
+        # provides uv and node which the later installers rely on.
+        install_apt_packages(packages["apt"])
+        install_homebrew(packages["brew"])
+
+        # The remaining chains use disjoint package managers, so run them
+        # concurrently. Steps within a chain still depend on each other.
+        chains = [
+            [
+                install_rust,
+                functools.partial(
+                    install_rustup_components, packages["rustup-component"]
+                ),
+            ],
+            [
+                functools.partial(install_python, packages["uv-python"]),
+                functools.partial(install_python_tools, packages["uv-tool"]),
+            ],
+            [functools.partial(install_npx, packages["npx"])],
+        ]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            # Consume the results so failures in any chain propagate here
+            list(executor.map(run_in_order, chains))
+    finally:
+        stop_log_listener()
 
     logger.info(
         "Development environment setup complete! All packages have been installed successfully."